@@ -1,8 +1,12 @@
 import os
+import sqlite3
 
 from flask import Flask
 from flask_bcrypt import Bcrypt
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 app = Flask(__name__)
 # Core configuration
@@ -10,14 +14,48 @@ app.config['SECRET_KEY'] = 'a_very_secret_key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
 app.config['UPLOAD_FOLDER'] = 'uploads/'
 app.config['ALLOWED_EXTENSIONS'] = {'pdf', 'doc', 'docx', 'xls', 'xlsx'}
-app.config['GEOAPIFY_API_KEY'] = "380c58ce52a64969a8f5a6e5ea6106da"
+# Werkzeug refuses larger request bodies with 413 before reading them (10 MB uploads)
+app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+# Geoapify key from the environment; without one, optimized route times are not calculated
+app.config['GEOAPIFY_API_KEY'] = os.environ.get('GEOAPIFY_API_KEY')
+if not app.config['GEOAPIFY_API_KEY']:
+    print("GEOAPIFY_API_KEY is not set; geocoding and routing are disabled")
+# Max Geoapify requests per second across all worker threads (free plan allows 5); 0 disables
+app.config['GEOAPIFY_RATE_LIMIT'] = 5
+# bcrypt cost factor for new hashes (Flask-Bcrypt defaults to 12); existing hashes keep their own cost
+app.config['BCRYPT_LOG_ROUNDS'] = 10
+
+# Built report documents are cached here, per file version, user and format
+app.config['REPORT_FOLDER'] = os.path.join(app.instance_path, 'reports')
+# Set when a front-end server (Apache mod_xsendfile, lighttpd) can send files
+# named in an X-Sendfile header, so cached reports skip the Python worker
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+        Tune each new SQLite connection: WAL lets readers proceed while an upload
+        is writing, NORMAL sync halves fsyncs per commit, and a 64 MB page cache
+        keeps hot indexes in memory.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
 # Initialize extensions
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
+migrate = Migrate(app, db)
 
 # Import route modules to register their endpoints
 from . import routes
@@ -1,7 +1,8 @@
+import pandas as pd
 from flask import render_template, redirect, url_for, flash, session
 
-from . import app
-from .helpers import update_cached_routes, generate_cost_waste_chart
+from . import app, db
+from .helpers import pending_routes, generate_cost_waste_chart, schedule_route_updates
 from .models import File, InefficientRoute
 
 
@@ -20,50 +21,54 @@ def cost_analysis(file_id=None):
 
     # If no specific file selected, list all user-uploaded files
     if file_id is None:
-        files_list = File.query.filter_by(user_id=session['user_id']).all()
+        files_list = db.session.query(File.id, File.filename, File.size, File.upload_date).filter(
+            File.user_id == session['user_id']
+        ).all()
         return render_template("cost_analysis.html",
                                files=files_list,
                                cost_data=None,
                                chart_url=None,
                                selected_file=None)
 
-    # Retrieve all inefficient routes for the given file
-    routes = InefficientRoute.query.filter_by(file_id=file_id).all()
-    # Update routes with optimized times and savings if needed
-    update_cached_routes(routes)
-    cost_data = []
-    # Build cost_data list: one entry per route
-    for r in routes:
-        try:
-            # Calculate actual duration in hours
-            actual_duration = (r.actual_delivery_time - r.starting_time).total_seconds() / 3600.0
-        except Exception:
-            # Skip routes with invalid timestamps
-            continue
+    # Routes still lacking optimization data are filled in by a background job;
+    # the page shows the routes optimized so far
+    if pending_routes(file_id).count():
+        schedule_route_updates(file_id)
+        flash("Optimized route times are being calculated. Refresh the page shortly to see them.", "info")
 
-        # Only include routes where optimized time is available
-        if r.optimized_delivery_time is None:
-            continue
+    # Load only the needed columns of routes that have an optimized time
+    rows = db.session.query(
+        InefficientRoute.id,
+        InefficientRoute.base_address,
+        InefficientRoute.shipping_address,
+        InefficientRoute.actual_duration_hours,
+        InefficientRoute.max_delivery_cost,
+        InefficientRoute.optimized_delivery_time
+    ).filter(
+        InefficientRoute.file_id == file_id,
+        InefficientRoute.optimized_delivery_time.isnot(None)
+    ).order_by(InefficientRoute.id).all()
 
-        optimized_time = r.optimized_delivery_time
-        # Compute cost on optimized and actual durations
-        optimized_cost = r.max_delivery_cost * optimized_time
-        actual_cost = r.max_delivery_cost * actual_duration
-        # Calculate cost savings
-        cost_saved = actual_cost - optimized_cost
+    cost_data = []
+    if rows:
+        df = pd.DataFrame(rows, columns=[
+            "route_id", "base_address", "shipping_address",
+            "actual_duration", "max_delivery_cost", "optimized_time"
+        ])
+        # Compute costs and savings as whole-column operations
+        df["optimized_cost"] = df["max_delivery_cost"] * df["optimized_time"]
+        df["actual_cost"] = df["max_delivery_cost"] * df["actual_duration"]
+        df["cost_saved"] = df["actual_cost"] - df["optimized_cost"]
 
-        # Append a dict for rendering in the table
-        cost_data.append({
-            "route_id": r.id,
-            "base_address": r.base_address,
-            "shipping_address": r.shipping_address,
-            "actual_duration": round(actual_duration, 2),
-            "optimized_time": round(optimized_time, 2),
-            "max_delivery_cost": r.max_delivery_cost,
-            "optimized_cost": round(optimized_cost, 2),
-            "actual_cost": round(actual_cost, 2),
-            "cost_saved": round(cost_saved, 2)
-        })
+        # One dict per route for rendering in the table
+        cost_data = df.round({
+            "actual_duration": 2, "optimized_time": 2, "optimized_cost": 2,
+            "actual_cost": 2, "cost_saved": 2
+        })[[
+            "route_id", "base_address", "shipping_address",
+            "actual_duration", "optimized_time", "max_delivery_cost",
+            "optimized_cost", "actual_cost", "cost_saved"
+        ]].to_dict('records')
 
     chart_url = None
     # Generate bar-chart URL if there is any cost data
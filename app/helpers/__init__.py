@@ -1,3 +1,5 @@
-from .file_parser import parse_excel, to_float
-from .geoapify import get_coordinates, get_optimized_route_time, update_cached_routes
-from .report_utils import generate_summary, generate_cost_waste_chart
+from .auth import current_user, current_user_files
+from .file_parser import iter_route_batches, parse_excel, to_float
+from .geoapify import get_coordinates, get_optimized_route_time, pending_routes, update_cached_routes
+from .report_utils import generate_cost_waste_chart, get_summary, invalidate_summary, remove_cached_reports
+from .route_tasks import route_updates_running, schedule_route_updates
@@ -0,0 +1,27 @@
+from flask import g, session
+
+from app import db
+from app.models import File, User
+
+
+def current_user():
+    """
+        Return the logged-in User (or None), fetching it from the database
+        at most once per request and memoizing it on flask.g.
+    """
+    if 'user' not in g:
+        # Session.get checks the identity map before issuing a SELECT
+        g.user = db.session.get(User, session['user_id']) if 'user_id' in session else None
+    return g.user
+
+
+def current_user_files():
+    """
+        Return (id, filename) rows of the logged-in user's files (or []), queried
+        at most once per request and memoized on flask.g.
+    """
+    if 'user_files' not in g:
+        g.user_files = db.session.query(File.id, File.filename).filter(
+            File.user_id == session['user_id']
+        ).order_by(File.id).all() if 'user_id' in session else []
+    return g.user_files
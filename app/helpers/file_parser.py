@@ -1,64 +1,119 @@
-from datetime import timedelta
+from importlib.util import find_spec
 
+import numpy as np
 import pandas as pd
 
+# Routes delayed by more than this many hours are considered inefficient
+DELAY_THRESHOLD_HOURS = 24
 
-def parse_excel(file_path):
-    required_cols = [
-        "Base Address", "Shipping Address", "Starting Time",
-        "Expected Delivery Time (hours)", "Actual Delivery Time (hours)",
-        "Expected Delivery Cost (VND)", "Actual Delivery Cost (VND)",
-        "Max Delivery Cost (VND/hr)"
-    ]
-    result = {"inefficient_routes": []}
+# Columns a sheet must provide to be parsed for routes
+REQUIRED_COLS = [
+    "Base Address", "Shipping Address", "Starting Time",
+    "Expected Delivery Time (hours)", "Actual Delivery Time (hours)",
+    "Expected Delivery Cost (VND)", "Actual Delivery Cost (VND)",
+    "Max Delivery Cost (VND/hr)"
+]
+_REQUIRED_SET = frozenset(REQUIRED_COLS)
+
+# The Rust calamine reader is much faster when python-calamine is installed;
+# otherwise let pandas pick its default engine for the file type
+_EXCEL_ENGINE = 'calamine' if find_spec('python_calamine') else None
+
+# Columns holding numbers that may arrive as text with thousands separators
+_NUMERIC_COLS = [
+    "Expected Delivery Time (hours)", "Actual Delivery Time (hours)",
+    "Expected Delivery Cost (VND)", "Actual Delivery Cost (VND)",
+    "Max Delivery Cost (VND/hr)"
+]
+
+
+def _compute_delays_and_mask(exp, act, threshold=DELAY_THRESHOLD_HOURS):
+    """
+        Vectorized delay kernel over float64 arrays of expected/actual hours.
+        Returns the per-row delays, rounded to 6 places like the delay_hours backfill,
+        and a boolean mask of rows delayed past threshold; NaN delays compare False,
+        so unparseable rows drop out of the mask.
+    """
+    delays = np.round(act - exp, 6)
+    return delays, delays > threshold
+
+
+def _clean_numeric(s):
+    """
+        Convert a column to float64 in one vectorized pass; unparseable cells become NaN.
+        Columns pandas already read as numbers skip the string round-trip entirely.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(np.float64)
+    return pd.to_numeric(
+        s.astype('string').str.replace(',', '', regex=False).str.strip(),
+        errors='coerce'
+    ).astype(np.float64)
+
+
+def iter_route_batches(source, batch_size=5000):
+    """
+        Yield lists of inefficient-route dicts (delay over DELAY_THRESHOLD_HOURS)
+        parsed from every matching sheet, at most batch_size routes per list.
+        source may be a path or a binary file-like object.
+    """
     try:
-        # auto-closes the ExcelFile when done
-        with pd.ExcelFile(file_path) as xls:
-            for sheet in xls.sheet_names:
-                df = xls.parse(sheet)
-                df.columns = df.columns.str.strip()
-                if not set(required_cols).issubset(df.columns):
-                    continue
-                for _, row in df.iterrows():
-                    if any(pd.isnull(row[col]) for col in required_cols):
-                        continue
-
-                    st = row["Starting Time"]
-                    exp_hours = to_float(row["Expected Delivery Time (hours)"])
-                    act_hours = to_float(row["Actual Delivery Time (hours)"])
-                    if exp_hours is None or act_hours is None:
-                        continue
-
-                    diff = act_hours - exp_hours
-                    if diff <= 24:
-                        continue
-
-                    expected_dt = st + timedelta(hours=exp_hours)
-                    actual_dt = st + timedelta(hours=act_hours)
-                    ec = to_float(row["Expected Delivery Cost (VND)"])
-                    ac = to_float(row["Actual Delivery Cost (VND)"])
-                    mc = to_float(row["Max Delivery Cost (VND/hr)"])
-                    if None in (ec, ac, mc):
-                        continue
-
-                    route = {
-                        "base_address": str(row["Base Address"]),
-                        "shipping_address": str(row["Shipping Address"]),
-                        "starting_time": st,
-                        "expected_delivery_time": expected_dt,
-                        "actual_delivery_time": actual_dt,
-                        "expected_delivery_cost": ec,
-                        "actual_delivery_cost": ac,
-                        "max_delivery_cost": mc,
-                        "delay_hours": diff
-                    }
-                    result["inefficient_routes"].append(route)
+        # Read every sheet in one pass, loading only the required columns
+        sheets = pd.read_excel(
+            source, sheet_name=None, engine=_EXCEL_ENGINE,
+            usecols=lambda c: str(c).strip() in _REQUIRED_SET
+        )
+        for df in sheets.values():
+            # A few dozen headers: a plain comprehension beats building a new Index via .str
+            df.columns = [c.strip() if isinstance(c, str) else c for c in df.columns]
+            if not _REQUIRED_SET.issubset(df.columns):
+                continue
+            df = df.dropna(subset=REQUIRED_COLS)
+
+            # Clean columns in one vectorized pass each; unparseable cells become NaN/NaT
+            for c in _NUMERIC_COLS:
+                df[c] = _clean_numeric(df[c])
+            df["Starting Time"] = pd.to_datetime(df["Starting Time"], errors='coerce')
+            df = df.dropna(subset=REQUIRED_COLS)
+
+            # Filter on delay over whole columns before building any output
+            exp = df["Expected Delivery Time (hours)"].to_numpy(np.float64)
+            act = df["Actual Delivery Time (hours)"].to_numpy(np.float64)
+            delays, mask = _compute_delays_and_mask(exp, act)
+            df = df[mask]
+
+            # Build every output column as a vector, then emit plain dicts per batch
+            st = df["Starting Time"]
+            routes = pd.DataFrame({
+                "base_address": df["Base Address"].astype(str),
+                "shipping_address": df["Shipping Address"].astype(str),
+                "starting_time": st,
+                "expected_delivery_time": st + pd.to_timedelta(df["Expected Delivery Time (hours)"], unit='h'),
+                "actual_delivery_time": st + pd.to_timedelta(df["Actual Delivery Time (hours)"], unit='h'),
+                "expected_delivery_cost": df["Expected Delivery Cost (VND)"],
+                "actual_delivery_cost": df["Actual Delivery Cost (VND)"],
+                "max_delivery_cost": df["Max Delivery Cost (VND/hr)"],
+                "delay_hours": delays[mask],
+                "actual_duration_hours": df["Actual Delivery Time (hours)"]
+            })
+            for i in range(0, len(routes), batch_size):
+                yield routes.iloc[i:i + batch_size].to_dict('records')
     except Exception as e:
         print(f"Error processing Excel file: {e}")
-    return result
+
+
+def parse_excel(source):
+    """Collect every batch from iter_route_batches into a single result dict."""
+    return {"inefficient_routes": [r for batch in iter_route_batches(source) for r in batch]}
 
 
 def to_float(value):
+    """Lenient scalar conversion for free-form values (e.g. stored JSON); not used on Excel columns."""
+    # JSON numbers are already int/float; skip the string round-trip (bool stays excluded)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if value is None:
+        return None
     try:
         return float(str(value).replace(',', '').strip())
     except Exception:
@@ -1,10 +1,118 @@
-from urllib.parse import quote_plus
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 import requests
 from flask import current_app
+from requests.adapters import HTTPAdapter
+from sqlalchemy import tuple_
+from urllib3.util.retry import Retry
 
 from app import db
 
+# Shared session so Geoapify calls reuse pooled keep-alive HTTPS connections;
+# rate-limit and transient server errors are retried with backoff
+SESSION = requests.Session()
+SESSION.headers.update({"Accept": "application/json"})
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=32, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# (connect, read) timeouts so a stalled Geoapify call cannot hang a request
+TIMEOUT = (3.05, 10)
+
+# Stored coordinates older than this are looked up again
+GEOCODE_TTL = timedelta(days=30)
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Result of a lookup that failed in transport or with an HTTP error, as opposed
+# to one Geoapify answered without a match; routes depending on it stay pending
+_LOOKUP_FAILED = object()
+
+
+class _NoResult(LookupError):
+    """Geoapify answered the request but had no match for it."""
+
+
+def normalize_address(address):
+    """Canonical form of an address for caching: trimmed, lower-cased, single-spaced."""
+    return _WHITESPACE.sub(' ', address.strip().lower())
+
+
+def address_key(address):
+    """SHA-1 of the normalized address, used as the GeocodeCache primary key."""
+    return hashlib.sha1(normalize_address(address).encode('utf-8')).hexdigest()
+
+
+class _RateLimiter:
+    """Hands out request slots at most `rate` per second, shared by all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self, rate):
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_LIMITER = _RateLimiter()
+
+
+def _api_get(url, params):
+    """GET a Geoapify endpoint through the shared session, within the configured rate limit."""
+    if not params.get("apiKey"):
+        raise LookupError("GEOAPIFY_API_KEY is not set")
+    _LIMITER.wait(current_app.config.get('GEOAPIFY_RATE_LIMIT'))
+    return SESSION.get(url, params=params, timeout=TIMEOUT)
+
+
+@lru_cache(maxsize=4096)
+def _geocode(address, api_key):
+    """
+        Look up (lat, lon) for an already-normalized address. Results are memoized
+        per process; failures raise instead of returning None so they are never cached.
+    """
+    # Query parameters for language, result limit, and format; requests URL-encodes them
+    params = {
+        "text": address,
+        "apiKey": api_key,
+        "lang": "vi", "limit": 1, "format": "json"
+    }
+    resp = _api_get("https://api.geoapify.com/v1/geocode/search", params)
+    # If the request succeeds, parse out the first result’s lat/lon
+    if resp.status_code == 200:
+        data = resp.json()
+        if data.get("results"):
+            r = data["results"][0]
+            return r.get("lat"), r.get("lon")
+        raise _NoResult("no geocoding result")
+    raise LookupError(f"geocoding failed (HTTP {resp.status_code})")
+
+
+def _locate(address):
+    """
+        (lat, lon) of address, or None if Geoapify has no match for it.
+        Transport and HTTP errors raise, so callers can retry them later.
+    """
+    try:
+        # Normalize so trivially different spellings share one cache entry
+        return _geocode(normalize_address(address), current_app.config['GEOAPIFY_API_KEY'])
+    except _NoResult:
+        return None
+
 
 def get_coordinates(address):
     """
@@ -12,24 +120,7 @@ def get_coordinates(address):
        using the Geoapify Geocoding API.
     """
     try:
-        # URL-encode the address to safely include it in the API request
-        encoded_address = quote_plus(address)
-        api_key = current_app.config['GEOAPIFY_API_KEY']
-        # Build the geocoding API URL with parameters for language, result limit, and format
-        url = (
-            f"https://api.geoapify.com/v1/geocode/search"
-            f"?text={encoded_address}"
-            f"&apiKey={api_key}"
-            f"&lang=vi&limit=1&format=json"
-        )
-        headers = {"Accept": "application/json"}
-        resp = requests.get(url, headers=headers)
-        # If the request succeeds, parse out the first result’s lat/lon
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get("results"):
-                r = data["results"][0]
-                return r.get("lat"), r.get("lon")
+        return _locate(address)
     except Exception as e:
         # Log any errors (network issues, parsing errors, etc.)
         print("Error geocoding:", e)
@@ -43,59 +134,181 @@ def get_optimized_route_time(base_address, shipping_address):
         using Geoapify’s Routing API.
     """
     # First, obtain coordinates for both endpoints
-    start_coords = get_coordinates(base_address)
-    end_coords = get_coordinates(shipping_address)
-    if not start_coords or not end_coords:
-        return None
+    return get_route_time_between(get_coordinates(base_address), get_coordinates(shipping_address))
 
+
+def _route_time(start_coords, end_coords):
+    """
+        Drive time (in hours) between two (lat, lon) points, or None if Geoapify
+        finds no route. Transport and HTTP errors raise, so callers can retry them later.
+    """
     api_key = current_app.config['GEOAPIFY_API_KEY']
-    # Build the routing API URL with drive mode, shortest path, and metric units
-    url = (
-        f"https://api.geoapify.com/v1/routing"
-        f"?waypoints={start_coords[0]},{start_coords[1]}|{end_coords[0]},{end_coords[1]}"
-        f"&mode=drive&type=short&units=metric"
-        f"&apiKey={api_key}"
-        f"&limit=1&format=json"
-    )
-    headers = {"Accept": "application/json"}
+    # Routing parameters: drive mode, shortest path, and metric units
+    params = {
+        "waypoints": f"{start_coords[0]},{start_coords[1]}|{end_coords[0]},{end_coords[1]}",
+        "mode": "drive", "type": "short", "units": "metric",
+        "apiKey": api_key,
+        "limit": 1, "format": "json"
+    }
+    resp = _api_get("https://api.geoapify.com/v1/routing", params)
+    if resp.status_code != 200:
+        raise LookupError(f"routing failed (HTTP {resp.status_code})")
+    data = resp.json()
+    if data.get("results"):
+        # time is in seconds
+        secs = data["results"][0].get("time")
+        if secs is not None:
+            return secs / 3600.0
+    return None
+
+
+def get_route_time_between(start_coords, end_coords):
+    """
+        Fetch the optimized drive time (in hours) between two already-geocoded
+        (lat, lon) points; returns None if either point is missing.
+    """
+    if not start_coords or not end_coords:
+        return None
     try:
-        resp = requests.get(url, headers=headers)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get("results"):
-                # time is in seconds
-                secs = data["results"][0].get("time")
-                if secs is not None:
-                    return secs / 3600.0
+        return _route_time(start_coords, end_coords)
     except Exception as e:
         print("Error fetching route:", e)
     return None
 
 
+def pending_routes(file_id):
+    """
+        Query for routes of file_id that update_cached_routes has not processed yet.
+        The one definition of "pending" used by the views and background jobs.
+    """
+    from app.models import InefficientRoute
+
+    return InefficientRoute.query.filter(
+        InefficientRoute.file_id == file_id,
+        InefficientRoute.optimization_checked_at.is_(None)
+    )
+
+
 def update_cached_routes(routes):
     """
-        For each InefficientRoute without optimization data, call the routing API,
-        compare the optimized time to the actual delivery duration,
-        and store any time savings back into the database.
-    """
-    updated = False
-
-    for r in routes:
-        # Only process if we haven't already computed optimized time or savings
-        if r.optimized_delivery_time is None or r.time_saved is None:
-            opt_time = get_optimized_route_time(r.base_address, r.shipping_address)
-            if opt_time is not None:
-                # Calculate actual delivery duration in hours
-                actual_dur = (r.actual_delivery_time - r.starting_time).total_seconds() / 3600.0
-                # Only record savings if optimized route is faster
-                if actual_dur > opt_time:
-                    r.optimized_delivery_time = round(opt_time, 2)
-                    r.time_saved = round(actual_dur - opt_time, 2)
-                    updated = True
-
-    # If any routes were updated, commit them in one batch
-    if updated:
+        For each InefficientRoute not processed yet, look up the optimized time
+        (RouteCache first, then the routing API), compare it to the actual delivery
+        duration, and store any time savings back into the database. Routes whose
+        lookup finished are marked processed, with or without a saving, and are not
+        picked up again; those hit by a transport or HTTP error stay pending, so the
+        next update retries them.
+    """
+    from app.models import File, GeocodeCache, InefficientRoute, RouteCache
+
+    # Without a key every lookup would fail; leave the routes pending until one is set
+    if not current_app.config.get('GEOAPIFY_API_KEY'):
+        print("Skipping route updates: GEOAPIFY_API_KEY is not set")
+        return
+
+    pending = [r for r in routes if r.optimization_checked_at is None]
+    if not pending:
+        return
+
+    # Reuse optimized times already fetched for the same pair by any earlier upload
+    pairs = {(r.base_address, r.shipping_address) for r in pending}
+    pair_time = {
+        (c.base_address, c.shipping_address): c.optimized_time
+        for c in RouteCache.query.filter(
+            tuple_(RouteCache.base_address, RouteCache.shipping_address).in_(list(pairs))
+        )
+    }
+
+    # Route each remaining pair once; the calls are network-bound, so fan them
+    # out over a thread pool, each worker inside its own app context. The shared
+    # limiter keeps the combined request rate within GEOAPIFY_RATE_LIMIT
+    missing = pairs - pair_time.keys()
+    if missing:
+        app = current_app._get_current_object()
+
+        def locate(address):
+            with app.app_context():
+                try:
+                    return address, _locate(address)
+                except Exception as e:
+                    print("Error geocoding:", e)
+                    return address, _LOOKUP_FAILED
+
+        def fetch(pair):
+            start, end = coords[pair[0]], coords[pair[1]]
+            if start is _LOOKUP_FAILED or end is _LOOKUP_FAILED:
+                return pair, _LOOKUP_FAILED
+            # No match for either address is a final answer: there is no route
+            if not start or not end:
+                return pair, None
+            with app.app_context():
+                try:
+                    return pair, _route_time(start, end)
+                except Exception as e:
+                    print("Error fetching route:", e)
+                    return pair, _LOOKUP_FAILED
+
+        # Start from coordinates stored by earlier runs, if still fresh
+        keys = {a: address_key(a) for pair in missing for a in pair}
+        cached = {
+            g.address_hash: g
+            for g in GeocodeCache.query.filter(GeocodeCache.address_hash.in_(set(keys.values())))
+        }
+        cutoff = datetime.utcnow() - GEOCODE_TTL
+        coords = {
+            a: (cached[k].lat, cached[k].lon)
+            for a, k in keys.items() if k in cached and cached[k].fetched_at >= cutoff
+        }
+
+        # Geocode each remaining address once before routing, so workers never
+        # race to look up the same depot; only HTTP runs in the workers
+        to_locate = keys.keys() - coords.keys()
+        with ThreadPoolExecutor(max_workers=min(16, max(len(to_locate), len(missing)))) as ex:
+            located = dict(ex.map(locate, to_locate))
+            coords.update(located)
+            fetched = dict(ex.map(fetch, missing))
+
+        now = datetime.utcnow()
+        for address, point in located.items():
+            if point is _LOOKUP_FAILED or not point or None in point:
+                continue
+            k = keys[address]
+            row = cached.get(k)
+            if row is None:
+                row = cached[k] = GeocodeCache(address_hash=k)
+                db.session.add(row)
+            row.lat, row.lon = point
+            row.fetched_at = now
+        db.session.add_all(
+            RouteCache(base_address=base, shipping_address=ship, optimized_time=t)
+            for (base, ship), t in fetched.items() if t is not None and t is not _LOOKUP_FAILED
+        )
+        pair_time.update(fetched)
+
+    updates = []
+    changed_files = set()
+    checked_at = datetime.utcnow()
+    for r in pending:
+        opt_time = pair_time[(r.base_address, r.shipping_address)]
+        if opt_time is _LOOKUP_FAILED:
+            continue
+        update = {"id": r.id, "optimization_checked_at": checked_at}
+        # Actual delivery duration in hours, stored at insert time;
+        # only record savings if optimized route is faster
+        if opt_time is not None and r.actual_duration_hours > opt_time:
+            update["optimized_delivery_time"] = round(opt_time, 2)
+            update["time_saved"] = round(r.actual_duration_hours - opt_time, 2)
+            changed_files.add(r.file_id)
+        updates.append(update)
+
+    # Write new cache entries (routes and coordinates) and all route updates in one batch
+    if updates:
         try:
+            db.session.bulk_update_mappings(InefficientRoute, updates)
+            if changed_files:
+                # Invalidates cached report summaries for these files
+                File.query.filter(File.id.in_(changed_files)).update(
+                    {File.updated_at: datetime.utcnow()}, synchronize_session=False
+                )
             db.session.commit()
         except Exception as e:
             db.session.rollback()
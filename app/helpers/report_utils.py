@@ -1,14 +1,89 @@
+import glob
+import hashlib
+import multiprocessing
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import matplotlib
+
+# Headless raster backend; selected before anything imports pyplot
+matplotlib.use('Agg')
 
-import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
-from flask import current_app, url_for
+from flask import abort, current_app, url_for
+from matplotlib.figure import Figure
+from sqlalchemy import case, func, select, update
 
+# Created on first use; charts are rendered in worker processes rather than
+# on the request thread
+_chart_executor = None
+_chart_executor_lock = threading.Lock()
 
-def generate_cost_waste_chart(cost_data, file_id):
+# One figure per worker process, cleared and redrawn for each chart
+_worker_fig = None
+
+# Built report summaries, keyed by file, user and File.updated_at (see get_summary)
+SUMMARY_TTL = 300
+_SUMMARY_CACHE_SIZE = 128
+_summary_cache = OrderedDict()
+_summary_lock = threading.Lock()
+
+# Superseded report documents used within this many seconds are kept, so a
+# request (or the front-end server, with X-Sendfile) still sending one finds it
+REPORT_CLEANUP_GRACE = 300
+
+
+def _get_chart_executor():
+    global _chart_executor
+    with _chart_executor_lock:
+        if _chart_executor is None:
+            # Spawned, not forked: a fork would copy the parent's other threads'
+            # locks (the DB pool, route jobs) in whatever state they are in
+            _chart_executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+    return _chart_executor
+
+
+def _render_cost_chart(labels, waste_millions, plot_path, fig=None):
     """
-    Generates and saves a bar chart of cost_saved for each route into the app's static folder,
-    then returns its URL.
+        Draw the cost-saved bar chart on fig (a fresh Figure if none is given)
+        and write it to plot_path. Only takes plain, picklable values.
+    """
+    if fig is None:
+        fig = Figure(figsize=(10, 5))
+    fig.clf()
+    ax = fig.add_subplot()
+    ax.bar(labels, waste_millions)
+    ax.set_xlabel('Route ID')
+    ax.set_ylabel('Cost Saved (Million VND)')
+    ax.set_title('Cost Saved per Inefficient Route')
+    ax.set_xticks(range(len(labels)))
+    ax.set_xticklabels(labels, rotation=45, ha='right')
+    ax.yaxis.set_major_formatter(mticker.FormatStrFormatter('%.1f'))
+
+    fig.tight_layout()
+    # Write under a temporary name first so readers never see a partial PNG
+    tmp_path = f"{plot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp_path, format='png')
+    os.replace(tmp_path, plot_path)
+
+
+def _render_in_worker(labels, waste_millions, plot_path):
+    """Worker-process entry point: reuse this process's figure across charts."""
+    global _worker_fig
+    if _worker_fig is None:
+        _worker_fig = Figure(figsize=(10, 5))
+    _render_cost_chart(labels, waste_millions, plot_path, _worker_fig)
+
+
+def render_cost_waste_chart(cost_data, file_id):
+    """
+        Ensure a bar chart of cost_saved per route exists in the app's static folder
+        and return its file path. Files are named by a hash of the plotted data, so
+        an unchanged analysis is served from disk without rendering again.
     """
     # Ensure plots directory exists inside Flask's static folder
     plot_dir = os.path.join(current_app.root_path, 'static', 'plots')
@@ -20,60 +95,113 @@ def generate_cost_waste_chart(cost_data, file_id):
     labels = [str(item['route_id']) for item in cost_data]
     waste_millions = [item['cost_saved'] / 1_000_000 for item in cost_data]
 
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.bar(labels, waste_millions)
-    ax.set_xlabel('Route ID')
-    ax.set_ylabel('Cost Saved (Million VND)')
-    ax.set_title('Cost Saved per Inefficient Route')
-    ax.set_xticks(range(len(labels)))
-    ax.set_xticklabels(labels, rotation=45, ha='right')
-    ax.yaxis.set_major_formatter(mticker.FormatStrFormatter('%.1f'))
+    digest = hashlib.blake2b(repr((labels, waste_millions)).encode(), digest_size=8).hexdigest()
+    plot_path = os.path.join(plot_dir, f"cost_waste_{file_id}_{digest}.png")
+    if os.path.exists(plot_path):
+        return plot_path
+
+    try:
+        _get_chart_executor().submit(_render_in_worker, labels, waste_millions, plot_path).result(timeout=30)
+    except Exception as e:
+        print("Error rendering chart in worker:", e)
+        _render_cost_chart(labels, waste_millions, plot_path)
 
-    plt.tight_layout()
-    plot_filename = f"cost_waste_{file_id}.png"
-    plot_path = os.path.join(plot_dir, plot_filename)
-    plt.savefig(plot_path)
-    plt.close(fig)
+    # Drop charts rendered for earlier versions of this file's data
+    for old in glob.glob(os.path.join(plot_dir, f"cost_waste_{file_id}_*.png")):
+        if old != plot_path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return plot_path
+
+
+def generate_cost_waste_chart(cost_data, file_id):
+    """
+    Generates and saves a bar chart of cost_saved for each route into the app's static folder,
+    then returns its URL.
+    """
+    plot_path = render_cost_waste_chart(cost_data, file_id)
+    if plot_path is None:
+        return None
 
     # Return URL for use in templates
-    return url_for('static', filename=f'plots/{plot_filename}')
+    return url_for('static', filename=f'plots/{os.path.basename(plot_path)}')
 
 
-def generate_summary(file_id, user):
+def _summary_data(file_id):
+    """
+        Build the user-independent part of a file's report from its stored routes:
+        file details, totals, both tables and the chart path. Neither waits on nor
+        updates routes, so the background route job can call it as well.
+    """
+    from app import db
     from app.models import File, InefficientRoute
-    from .geoapify import update_cached_routes
 
-    file = File.query.get_or_404(file_id)
-    routes = InefficientRoute.query.filter_by(file_id=file_id).all()
-    update_cached_routes(routes)
+    file = db.session.get(File, file_id)
+    if file is None:
+        abort(404)
 
-    # Count only those delayed by >24h
-    inefficient_count = len([
-        r for r in routes
-        if (r.actual_delivery_time - r.expected_delivery_time).total_seconds() / 3600 > 24
-    ])
+    # Read the table rows as plain Core rows, skipping ORM instantiation and identity tracking
+    routes = db.session.execute(
+        select(
+            InefficientRoute.id,
+            InefficientRoute.file_id,
+            InefficientRoute.base_address,
+            InefficientRoute.shipping_address,
+            InefficientRoute.starting_time,
+            InefficientRoute.expected_delivery_time,
+            InefficientRoute.actual_delivery_time,
+            InefficientRoute.expected_delivery_cost,
+            InefficientRoute.actual_delivery_cost,
+            InefficientRoute.max_delivery_cost,
+            InefficientRoute.optimized_delivery_time,
+            InefficientRoute.time_saved,
+            InefficientRoute.delay_hours,
+            InefficientRoute.actual_duration_hours
+        ).where(InefficientRoute.file_id == file_id).order_by(InefficientRoute.id)
+    ).all()
 
-    total_delay = sum((r.actual_delivery_time - r.expected_delivery_time).total_seconds() / 3600 for r in routes)
-    avg_delay = total_delay / inefficient_count if inefficient_count else 0
+    # Totals come from one aggregate query over stored numeric columns;
+    # SUM skips routes without optimized data
+    inefficient_count, total_delay, total_saved, total_cost_saved = db.session.query(
+        # Count only those delayed by >24h
+        func.coalesce(func.sum(case((InefficientRoute.delay_hours > 24, 1), else_=0)), 0),
+        func.coalesce(func.sum(InefficientRoute.delay_hours), 0),
+        func.coalesce(func.sum(InefficientRoute.time_saved), 0),
+        func.coalesce(func.sum(
+            InefficientRoute.max_delivery_cost
+            * (InefficientRoute.actual_duration_hours - InefficientRoute.optimized_delivery_time)
+        ), 0)
+    ).filter(InefficientRoute.file_id == file_id).one()
 
-    total_saved = sum(r.time_saved for r in routes if r.time_saved)
-    avg_saved = total_saved / inefficient_count if inefficient_count else 0
-
-    total_cost_saved = 0
+    # Build both tables in a single pass over the routes
     cost_table = []
+    ineff_table = []
     for r in routes:
-        try:
-            actual_dur = (r.actual_delivery_time - r.starting_time).total_seconds() / 3600.0
-        except Exception:
-            continue
+        ineff_table.append({
+            "file_id": r.file_id,
+            "base_address": r.base_address,
+            "shipping_address": r.shipping_address,
+            "starting_time": r.starting_time.strftime("%Y-%m-%d %H:%M"),
+            "expected_delivery_time": r.expected_delivery_time.strftime("%Y-%m-%d %H:%M"),
+            "actual_delivery_time": r.actual_delivery_time.strftime("%Y-%m-%d %H:%M"),
+            "expected_delivery_cost": r.expected_delivery_cost,
+            "actual_delivery_cost": r.actual_delivery_cost,
+            "max_delivery_cost": r.max_delivery_cost,
+            "delay_hours": round(r.delay_hours, 2),
+            "optimized_delivery_time": r.optimized_delivery_time if r.optimized_delivery_time is not None else "N/A",
+            "time_saved": r.time_saved if r.time_saved is not None else "N/A"
+        })
+
         if r.optimized_delivery_time is None:
             continue
 
+        actual_dur = r.actual_duration_hours
         opt_time = r.optimized_delivery_time
         opt_cost = r.max_delivery_cost * opt_time
         act_cost = r.max_delivery_cost * actual_dur
         saved = act_cost - opt_cost
-        total_cost_saved += saved
         cost_table.append({
             "route_id": r.id,
             "base_address": r.base_address,
@@ -86,37 +214,13 @@ def generate_summary(file_id, user):
             "cost_saved": round(saved, 2)
         })
 
+    avg_delay = total_delay / inefficient_count if inefficient_count else 0
+    avg_saved = total_saved / inefficient_count if inefficient_count else 0
     avg_cost_saved = total_cost_saved / inefficient_count if inefficient_count else 0
 
-    ineff_table = []
-    for r in routes:
-        try:
-            delay = (r.actual_delivery_time - r.expected_delivery_time).total_seconds() / 3600.0
-        except Exception:
-            delay = "N/A"
-        ineff_table.append({
-            "file_id": r.file_id,
-            "base_address": r.base_address,
-            "shipping_address": r.shipping_address,
-            "starting_time": r.starting_time.strftime("%Y-%m-%d %H:%M"),
-            "expected_delivery_time": r.expected_delivery_time.strftime("%Y-%m-%d %H:%M"),
-            "actual_delivery_time": r.actual_delivery_time.strftime("%Y-%m-%d %H:%M"),
-            "expected_delivery_cost": r.expected_delivery_cost,
-            "actual_delivery_cost": r.actual_delivery_cost,
-            "max_delivery_cost": r.max_delivery_cost,
-            "delay_hours": round(delay, 2) if isinstance(delay, (int, float)) else delay,
-            "optimized_delivery_time": r.optimized_delivery_time if r.optimized_delivery_time is not None else "N/A",
-            "time_saved": r.time_saved if r.time_saved is not None else "N/A"
-        })
-
-    # Generate chart URL
-    chart_url = generate_cost_waste_chart(cost_table, file_id) if cost_table else None
-
     return {
         "file_name": file.filename,
         "upload_date": file.upload_date,
-        "user_name": f"{user.first_name} {user.last_name}",
-        "user_email": user.email,
         "inefficient_routes": inefficient_count,
         "total_delayed_hours": round(total_delay, 2),
         "avg_delayed_hours": round(avg_delay, 2),
@@ -126,5 +230,133 @@ def generate_summary(file_id, user):
         "avg_cost_saved": round(avg_cost_saved, 2),
         "ineff_table": ineff_table,
         "cost_table": cost_table,
-        "chart_url": chart_url
+        # Generate chart file
+        "chart_path": render_cost_waste_chart(cost_table, file_id) if cost_table else None
     }
+
+
+def _for_user(data, user):
+    """Complete summary data with the requesting user's details and the chart URL."""
+    summary = dict(data)
+    summary["user_name"] = f"{user.first_name} {user.last_name}"
+    summary["user_email"] = user.email
+    chart_path = summary["chart_path"]
+    summary["chart_url"] = url_for('static', filename=f'plots/{os.path.basename(chart_path)}') if chart_path else None
+    return summary
+
+
+def _persist_summary(file_id, data, stamp):
+    """
+        Store summary data in File.summary_json, stamped with the updated_at it was
+        read at. Skipped if the file has changed since then.
+    """
+    from app import db
+    from app.models import File
+
+    # The chart path is per host and re-derived on load; datetimes go as ISO strings
+    stored = {k: v for k, v in data.items() if k != "chart_path"}
+    stored["upload_date"] = stored["upload_date"].isoformat()
+    try:
+        db.session.execute(
+            update(File).where(File.id == file_id, File.updated_at == stamp)
+            # Setting updated_at explicitly keeps its onupdate from bumping it
+            .values(summary_json=stored, summary_stamp=stamp, updated_at=stamp)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print("Error storing report summary:", e)
+
+
+def _load_summary(file_id, stored):
+    """Summary data from File.summary_json, re-rendering the chart if it is missing."""
+    data = dict(stored)
+    data["upload_date"] = datetime.fromisoformat(data["upload_date"])
+    data["chart_path"] = render_cost_waste_chart(data["cost_table"], file_id) if data["cost_table"] else None
+    return data
+
+
+def store_summary(file_id):
+    """
+        Build file_id's summary data and persist it on the File, so report
+        requests only serialize it. Called once the file's routes are optimized.
+    """
+    from app import db
+    from app.models import File
+
+    stamp = db.session.query(File.updated_at).filter(File.id == file_id).scalar()
+    if stamp is not None:
+        _persist_summary(file_id, _summary_data(file_id), stamp)
+
+
+def _summary_key(file_id, user, stamp):
+    # The user's name and email are part of the summary, so a profile edit is a new key
+    return file_id, user.id, user.first_name, user.last_name, user.email, stamp
+
+
+def get_summary(file, user):
+    """
+        Return the report summary of file for user. A result built in this process
+        within the last SUMMARY_TTL seconds is reused, then one persisted in
+        File.summary_json, as long as the file's updated_at has not changed since.
+        file is a File the caller has already loaded and checked ownership of.
+        Routes not optimized yet are left to a background job; the summary covers
+        what is stored now.
+    """
+    from .geoapify import pending_routes
+    from .route_tasks import schedule_route_updates
+
+    file_id = file.id
+    # Checked on every path: a cached or persisted summary may predate routes that
+    # are still pending (e.g. while no API key was set)
+    if pending_routes(file_id).count():
+        schedule_route_updates(file_id)
+
+    stamp = file.updated_at
+    with _summary_lock:
+        hit = _summary_cache.get(_summary_key(file_id, user, stamp))
+    if hit and time.monotonic() - hit[0] < SUMMARY_TTL:
+        return hit[1]
+
+    if file.summary_stamp == stamp and file.summary_json is not None:
+        data = _load_summary(file_id, file.summary_json)
+    else:
+        data = _summary_data(file_id)
+        _persist_summary(file_id, data, stamp)
+    summary = _for_user(data, user)
+
+    with _summary_lock:
+        _summary_cache[_summary_key(file_id, user, stamp)] = (time.monotonic(), summary)
+        while len(_summary_cache) > _SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return summary
+
+
+def invalidate_summary(file_id):
+    """Drop every cached summary of file_id."""
+    with _summary_lock:
+        for key in [k for k in _summary_cache if k[0] == file_id]:
+            del _summary_cache[key]
+
+
+def remove_cached_reports(file_id, keep_digest=None):
+    """
+        Delete report documents cached in REPORT_FOLDER for file_id, except those
+        built for keep_digest. When clearing out superseded versions (keep_digest
+        given), documents used within REPORT_CLEANUP_GRACE seconds are left for a
+        later call.
+    """
+    keep_prefix = f"report_{file_id}_{keep_digest}." if keep_digest else None
+    used_since = time.time() - REPORT_CLEANUP_GRACE
+    for old in glob.glob(os.path.join(current_app.config['REPORT_FOLDER'], f"report_{file_id}_*")):
+        name = os.path.basename(old)
+        # .tmp files are still being written by another request
+        if name.endswith('.tmp') or (keep_prefix and name.startswith(keep_prefix)):
+            continue
+        try:
+            # _cached_reports touches each document it hands out
+            if keep_prefix and os.path.getmtime(old) > used_since:
+                continue
+            os.remove(old)
+        except OSError:
+            pass
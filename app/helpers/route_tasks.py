@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from .geoapify import pending_routes, update_cached_routes
+from .report_utils import store_summary
+
+# Geocoding/routing for whole files runs here, off the request thread
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='route-updates')
+
+# file_id -> Future of the update currently queued or running for that file
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _update_file_routes(app, file_id):
+    """
+        Optimize every route of file_id that still lacks optimization data, then
+        persist the file's report summary so report requests need not build it.
+    """
+    # The app context tears down its own scoped session when it exits
+    with app.app_context():
+        try:
+            update_cached_routes(pending_routes(file_id).all())
+            store_summary(file_id)
+        except Exception as e:
+            print("Error updating routes in background:", e)
+
+
+def schedule_route_updates(file_id):
+    """
+        Queue a background update of file_id's pending routes and return at once.
+        A file already queued or running is not queued twice.
+    """
+    app = current_app._get_current_object()
+    with _jobs_lock:
+        job = _jobs.get(file_id)
+        if job is None or job.done():
+            job = _jobs[file_id] = _executor.submit(_update_file_routes, app, file_id)
+
+            def _forget(done, fid=file_id):
+                with _jobs_lock:
+                    if _jobs.get(fid) is done:
+                        del _jobs[fid]
+
+            job.add_done_callback(_forget)
+    return job
+
+
+def route_updates_running(file_id):
+    """True while a background update for file_id is queued or running."""
+    job = _jobs.get(file_id)
+    return job is not None and not job.done()
@@ -1,13 +1,24 @@
-import json
 from datetime import datetime, timedelta
 
-from flask import render_template, redirect, url_for, flash, session, request
+from flask import render_template, redirect, url_for, flash, session, request, jsonify
 
 from . import app, db
-from .helpers import update_cached_routes, to_float
+from .helpers import pending_routes, route_updates_running, schedule_route_updates, to_float
 from .models import File, InefficientRoute
 
 
+def _datetime_parser(sample):
+    """
+        Pick the timestamp parser for a stored payload once, from its first value:
+        datetime.fromisoformat when it reads as ISO 8601, else the legacy strptime format.
+    """
+    try:
+        datetime.fromisoformat(sample)
+        return datetime.fromisoformat
+    except (TypeError, ValueError):
+        return lambda s: datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+
+
 @app.route('/inefficient', methods=['GET', 'POST'])
 @app.route('/inefficient/<int:file_id>', methods=['GET', 'POST'])
 def show_inefficient(file_id=None):
@@ -19,19 +30,34 @@ def show_inefficient(file_id=None):
     # Handle form submission to identify new inefficient routes
     if request.method == 'POST':
         new_routes_count = 0
-        user_files = File.query.filter_by(user_id=session['user_id']).all()
+        # Only files whose stored payload has not been imported yet
+        user_files = File.query.filter(
+            File.user_id == session['user_id'],
+            File.parsed_data.isnot(None),
+            File.parsed_imported_at.is_(None)
+        ).all()
+
+        # Preload the keys of routes already stored for these files in one query,
+        # so each candidate is a set lookup rather than its own SELECT
+        existing = set(db.session.query(
+            InefficientRoute.file_id, InefficientRoute.base_address, InefficientRoute.starting_time
+        ).filter(InefficientRoute.file_id.in_([f.id for f in user_files])).all())
+
+        new_rows = []
         for file in user_files:
             if file.parsed_data:
                 try:
-                    # Load routes from stored JSON
-                    data = json.loads(file.parsed_data)
-                    for route in data.get("inefficient_routes", []):
-                        existing = InefficientRoute.query.filter_by(
-                            file_id=file.id,
-                            base_address=route["base_address"],
-                            starting_time=route["starting_time"]
-                        ).first()
-                        if existing:
+                    # parsed_data is already decoded by the JSON column type
+                    data = file.parsed_data
+                    routes_data = data.get("inefficient_routes", [])
+                    if routes_data:
+                        # Every timestamp in one payload shares a format; detect it once
+                        parse_dt = _datetime_parser(routes_data[0]["starting_time"])
+                    for route in routes_data:
+                        start_time = parse_dt(route["starting_time"])
+
+                        key = (file.id, route["base_address"], start_time)
+                        if key in existing:
                             continue
 
                         # Determine delay if not already provided
@@ -43,43 +69,47 @@ def show_inefficient(file_id=None):
                                 delay = av - ev
                             else:
                                 continue
+                        # Same 6-place rounding as the parser and the delay_hours backfill
+                        delay = round(delay, 6)
 
                         # Only record routes delayed over 24 hours
                         if delay > 24:
-                            try:
-                                start_time = datetime.fromisoformat(route["starting_time"])
-                            except Exception:
-                                start_time = datetime.strptime(route["starting_time"], "%Y-%m-%d %H:%M:%S")
-
                             # Compute expected and actual datetimes
                             expected_time = (
                                 start_time + timedelta(hours=route["expected_delivery_time"]) if isinstance(
                                     route["expected_delivery_time"], float)
-                                else datetime.fromisoformat(route["expected_delivery_time"]))
+                                else parse_dt(route["expected_delivery_time"]))
 
                             actual_time = (start_time + timedelta(hours=route["actual_delivery_time"]) if isinstance(
                                 route["actual_delivery_time"], float)
-                                           else datetime.fromisoformat(route["actual_delivery_time"]))
-
-                            # Create and add new InefficientRoute record
-                            new_ir = InefficientRoute(
-                                file_id=file.id,
-                                base_address=route["base_address"],
-                                shipping_address=route["shipping_address"],
-                                starting_time=start_time,
-                                expected_delivery_time=expected_time,
-                                actual_delivery_time=actual_time,
-                                expected_delivery_cost=to_float(route["expected_delivery_cost"]),
-                                actual_delivery_cost=to_float(route["actual_delivery_cost"]),
-                                max_delivery_cost=to_float(route["max_delivery_cost"])
-                            )
-                            db.session.add(new_ir)
+                                           else parse_dt(route["actual_delivery_time"]))
+
+                            # Queue the new InefficientRoute row for one batched insert
+                            new_rows.append({
+                                "file_id": file.id,
+                                "base_address": route["base_address"],
+                                "shipping_address": route["shipping_address"],
+                                "starting_time": start_time,
+                                "expected_delivery_time": expected_time,
+                                "actual_delivery_time": actual_time,
+                                "expected_delivery_cost": to_float(route["expected_delivery_cost"]),
+                                "actual_delivery_cost": to_float(route["actual_delivery_cost"]),
+                                "max_delivery_cost": to_float(route["max_delivery_cost"]),
+                                "delay_hours": delay,
+                                "actual_duration_hours": (actual_time - start_time).total_seconds() / 3600.0
+                            })
+                            # Also skips repeats within the same stored payload
+                            existing.add(key)
                             new_routes_count += 1
+                    # Later submissions skip this file entirely
+                    file.parsed_imported_at = datetime.utcnow()
                 except Exception as e:
                     print("Error processing file", file.filename, e)
 
-        # Commit all new records at once
+        # Insert and commit all new records at once
         try:
+            if new_rows:
+                db.session.execute(InefficientRoute.__table__.insert(), new_rows)
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -94,20 +124,39 @@ def show_inefficient(file_id=None):
         return redirect(url_for('show_inefficient'))
 
     if file_id is None:
-        file_ids = [fid for (fid,) in db.session.query(InefficientRoute.file_id).distinct().all()]
-        files_list = File.query.filter(File.id.in_(file_ids), File.user_id == session['user_id']).all()
+        # Files of this user that have routes, resolved in a single statement via a subquery
+        files_list = db.session.query(File.id, File.filename, File.size, File.upload_date).filter(
+            File.user_id == session['user_id'],
+            File.id.in_(db.session.query(InefficientRoute.file_id))
+        ).all()
         return render_template("inefficient.html", files=files_list, routes=None, selected_file=None)
     else:
-        # Show detailed routes for the selected file
-        routes = InefficientRoute.query.filter_by(file_id=file_id).all()
-        update_cached_routes(routes)
+        # Routes still lacking optimization data are filled in by a background
+        # job; the page renders what is stored now and shows N/A for the rest
+        if pending_routes(file_id).count():
+            schedule_route_updates(file_id)
+            flash("Optimized route times are being calculated. Refresh the page shortly to see them.", "info")
+
+        # Show one page of detailed routes, selecting just the rendered columns
+        pagination = db.session.query(
+            InefficientRoute.file_id,
+            InefficientRoute.base_address,
+            InefficientRoute.shipping_address,
+            InefficientRoute.starting_time,
+            InefficientRoute.expected_delivery_time,
+            InefficientRoute.actual_delivery_time,
+            InefficientRoute.expected_delivery_cost,
+            InefficientRoute.actual_delivery_cost,
+            InefficientRoute.max_delivery_cost,
+            InefficientRoute.optimized_delivery_time,
+            InefficientRoute.time_saved,
+            InefficientRoute.delay_hours
+        ).filter(InefficientRoute.file_id == file_id).order_by(InefficientRoute.id).paginate(
+            page=request.args.get('page', 1, type=int), per_page=100
+        )
 
         ineff_data = []
-        for r in routes:
-            try:
-                delay = (r.actual_delivery_time - r.expected_delivery_time).total_seconds() / 3600.0
-            except Exception:
-                delay = "N/A"
+        for r in pagination.items:
             ineff_data.append({
                 "file_id": r.file_id,
                 "base_address": r.base_address,
@@ -118,10 +167,25 @@ def show_inefficient(file_id=None):
                 "expected_delivery_cost": r.expected_delivery_cost,
                 "actual_delivery_cost": r.actual_delivery_cost,
                 "max_delivery_cost": r.max_delivery_cost,
-                "delay_hours": round(delay, 2) if isinstance(delay, (int, float)) else delay,
+                "delay_hours": round(r.delay_hours, 2),
                 "optimized_delivery_time": r.optimized_delivery_time if r.optimized_delivery_time is not None else "N/A",
                 "time_saved": r.time_saved if r.time_saved is not None else "N/A"
             })
 
         selected_file = File.query.get(file_id)
-        return render_template("inefficient.html", files=None, routes=ineff_data, selected_file=selected_file)
+        return render_template("inefficient.html", files=None, routes=ineff_data,
+                               selected_file=selected_file, pagination=pagination)
+
+
+@app.route('/inefficient/<int:file_id>/status')
+def inefficient_status(file_id):
+    """Report whether a file's routes are still being optimized, for pages that poll."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Login required."}), 401
+
+    File.query.filter_by(id=file_id, user_id=session['user_id']).first_or_404()
+    return jsonify({
+        "file_id": file_id,
+        "pending": pending_routes(file_id).count(),
+        "running": route_updates_running(file_id)
+    })
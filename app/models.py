@@ -18,17 +18,33 @@ class File(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     upload_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Bumped whenever the file or its routes change; keys cached report summaries
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     size = db.Column(db.Float, nullable=False)
-    user_id = db.Column(db.Integer, nullable=False)
-    parsed_data = db.Column(db.Text, nullable=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    # Stored as JSON and decoded by SQLAlchemy on load
+    parsed_data = db.Column(db.JSON, nullable=True)
+    # Set once parsed_data has been imported into InefficientRoute rows
+    parsed_imported_at = db.Column(db.DateTime, nullable=True)
+    # Report summary built in the background after upload (see store_summary),
+    # valid while summary_stamp equals updated_at. Deferred: only reports read it
+    summary_json = db.deferred(db.Column(db.JSON, nullable=True))
+    summary_stamp = db.Column(db.DateTime, nullable=True)
 
     def __repr__(self):
         return f"File('{self.filename}', UserID={self.user_id})"
 
 
 class InefficientRoute(db.Model):
+    # Backs the (file_id, base_address, starting_time) duplicate check in the
+    # /inefficient importer. Not unique: one depot can legitimately dispatch
+    # several shipments at the same time
+    __table_args__ = (
+        db.Index('ix_ir_file_base_start', 'file_id', 'base_address', 'starting_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    file_id = db.Column(db.Integer, db.ForeignKey('file.id'), nullable=False)
+    file_id = db.Column(db.Integer, db.ForeignKey('file.id'), nullable=False, index=True)
     base_address = db.Column(db.String(255), nullable=False)
     shipping_address = db.Column(db.String(255), nullable=False)
     starting_time = db.Column(db.DateTime, nullable=False)
@@ -39,7 +55,35 @@ class InefficientRoute(db.Model):
     max_delivery_cost = db.Column(db.Float, nullable=False)
     optimized_delivery_time = db.Column(db.Float, nullable=True)
     time_saved = db.Column(db.Float, nullable=True)
+    # Stored at insert time so reads and ORDER BY never recompute it
+    delay_hours = db.Column(db.Float, nullable=False, index=True)
+    # Hours from starting_time to actual_delivery_time, also stored at insert time
+    actual_duration_hours = db.Column(db.Float, nullable=False)
+    # Set once update_cached_routes has processed the route, whether it found a
+    # saving or not (optimized time left NULL). Left NULL after transport or HTTP
+    # errors, so the next update retries the route
+    optimization_checked_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"InefficientRoute(FileID={self.file_id}, BaseAddress={self.base_address}, Delay={round(self.delay_hours, 2)}h)"
+
+
+class RouteCache(db.Model):
+    # Optimized drive time per address pair, shared across uploads and files
+    base_address = db.Column(db.String(255), primary_key=True)
+    shipping_address = db.Column(db.String(255), primary_key=True)
+    optimized_time = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"RouteCache('{self.base_address}' -> '{self.shipping_address}', {round(self.optimized_time, 2)}h)"
+
+
+class GeocodeCache(db.Model):
+    # Coordinates per normalized address; the SHA-1 key bounds the row width
+    address_hash = db.Column(db.String(40), primary_key=True)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     def __repr__(self):
-        delay = (self.actual_delivery_time - self.expected_delivery_time).total_seconds() / 3600.0
-        return f"InefficientRoute(FileID={self.file_id}, BaseAddress={self.base_address}, Delay={round(delay, 2)}h)"
+        return f"GeocodeCache('{self.address_hash}', {self.lat}, {self.lon})"
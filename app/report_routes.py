@@ -1,14 +1,22 @@
 # app/report_routes.py
 
+import hashlib
 import io
 import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 
 import xlsxwriter
 from docx import Document
 from docx.shared import Inches
 from flask import (
     render_template, redirect, url_for,
-    flash, session, send_file
+    flash, session, send_file, abort, g
 )
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, A4
@@ -20,45 +28,122 @@ from reportlab.platypus import (
     Table, TableStyle, Image
 )
 
-from . import app
-from .helpers import generate_summary
-from .models import User
-
-# Register custom fonts for PDF output (Arial and Arial-Bold)
-pdfmetrics.registerFont(TTFont('Arial', r'C:\Windows\Fonts\arial.ttf'))
-pdfmetrics.registerFont(TTFont('Arial-Bold', r'C:\Windows\Fonts\arialbd.ttf'))
+from . import app, db
+from .helpers import get_summary, remove_cached_reports
+from .models import File, User
+
+# Report files are built in memory up to this size, then spill to a temp file
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# Builds missing report formats side by side, e.g. for the bundle download
+_build_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='report-build')
+
+# Register custom fonts for PDF output (Arial and Arial-Bold), falling back to
+# the built-in Helvetica where the Windows fonts are not installed
+ARIAL_PATH = r'C:\Windows\Fonts\arial.ttf'
+ARIAL_BOLD_PATH = r'C:\Windows\Fonts\arialbd.ttf'
+FONT, BOLD_FONT = 'Helvetica', 'Helvetica-Bold'
+try:
+    if os.path.exists(ARIAL_PATH) and os.path.exists(ARIAL_BOLD_PATH):
+        pdfmetrics.registerFont(TTFont('Arial', ARIAL_PATH))
+        pdfmetrics.registerFont(TTFont('Arial-Bold', ARIAL_BOLD_PATH))
+        FONT, BOLD_FONT = 'Arial', 'Arial-Bold'
+except Exception as e:
+    print("Error registering PDF fonts:", e)
+
+# PDF styles are built once at import; ParagraphStyles are only read while
+# laying out, so every request can share them
+PDF_STYLES = getSampleStyleSheet()
+PDF_STYLES['Title'].fontName = BOLD_FONT
+PDF_STYLES['Heading2'].fontName = BOLD_FONT
+PDF_STYLES['Heading5'].fontName = BOLD_FONT
+PDF_STYLES['BodyText'].fontName = FONT
+
+# Paragraph styles for table body and headers
+BODY_STYLE = ParagraphStyle(
+    'body', parent=PDF_STYLES['BodyText'],
+    fontName=FONT, fontSize=8, leading=10
+)
+HEADER_STYLE = ParagraphStyle(
+    'hdr', parent=PDF_STYLES['Heading5'],
+    fontName=BOLD_FONT, fontSize=8,
+    leading=10, alignment=1  # centered
+)
 
+# Column keys and header labels of the PDF and Word route tables
+INEFF_KEYS = [
+    "base_address", "shipping_address",
+    "starting_time", "expected_delivery_time",
+    "actual_delivery_time", "delay_hours",
+    "optimized_delivery_time", "time_saved"
+]
+INEFF_HEADERS = [
+    "Base Address", "Shipping Address",
+    "Start Time", "Expected Time",
+    "Actual Time", "Delay (h)",
+    "Optimized (h)", "Time Saved (h)"
+]
+COST_KEYS = [
+    "route_id", "base_address", "shipping_address",
+    "actual_duration", "optimized_time",
+    "max_delivery_cost", "optimized_cost",
+    "actual_cost", "cost_saved"
+]
+COST_HEADERS = [
+    "Route ID", "Base Address", "Shipping Address",
+    "Actual Dur (h)", "Optimized (h)",
+    "Max Cost", "Opt Cost", "Act Cost", "Saved"
+]
+
+# Table columns long enough to need wrapping; every other cell is a plain string
+WRAPPED_KEYS = frozenset({"base_address", "shipping_address"})
+
+# One C-level call pulls a route's cells out of its summary dict, in column order
+INEFF_GETTER = itemgetter(*INEFF_KEYS)
+COST_GETTER = itemgetter(*COST_KEYS)
+INEFF_WRAP = [k in WRAPPED_KEYS for k in INEFF_KEYS]
+COST_WRAP = [k in WRAPPED_KEYS for k in COST_KEYS]
+
+
+@lru_cache(maxsize=64)
+def _load_chart_bytes(path):
+    """
+        Read a chart PNG once per process. Chart file names hash the plotted data,
+        so the bytes behind a given path never change.
+    """
+    with open(path, 'rb') as f:
+        return f.read()
 
-@app.route('/report/<int:file_id>')
-def report_preview(file_id):
-    """Render an HTML preview of the report before download."""
-    if 'user_id' not in session:
-        flash("Login required.", "danger")
-        return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
-    summary = generate_summary(file_id, user)
-    chart_url = f"/static/plots/cost_waste_{file_id}.png"
-    return render_template(
-        "report_preview.html",
-        summary=summary,
-        file_id=file_id,
-        chart_url=chart_url
-    )
+def _chart_stream(path):
+    """Return a fresh BytesIO over the chart at path, or None if there is no chart."""
+    if not path:
+        return None
+    try:
+        return io.BytesIO(_load_chart_bytes(path))
+    except OSError:
+        return None
 
 
-@app.route('/download_report_pdf/<int:file_id>')
-def download_report_pdf(file_id):
-    """Build and send the report as a PDF file."""
-    if 'user_id' not in session:
-        flash("Login required.", "danger")
-        return redirect(url_for('login'))
-
-    user = User.query.get(session['user_id'])
-    summary = generate_summary(file_id, user)
-
-    # Create an in-memory buffer and SimpleDocTemplate for PDF
-    buffer = io.BytesIO()
+def _load_report_ctx(file_id):
+    """
+        Fetch the logged-in user and their file in one query. 404s if the file
+        does not exist or belongs to another user.
+    """
+    ctx = db.session.query(User, File).join(File, File.user_id == User.id).filter(
+        User.id == session['user_id'], File.id == file_id
+    ).first()
+    if ctx is None:
+        abort(404)
+    # Memoize the user for current_user() like any other lookup in this request
+    g.user = ctx.User
+    return ctx.User, ctx.File
+
+
+def build_pdf(summary):
+    """Render a report summary as a PDF; returns a spooled buffer rewound to the start."""
+    # Create a spooled buffer and SimpleDocTemplate for PDF
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+b')
     doc = SimpleDocTemplate(
         buffer,
         pagesize=landscape(A4),
@@ -66,24 +151,7 @@ def download_report_pdf(file_id):
         topMargin=20, bottomMargin=20
     )
 
-    # Override default styles to use registered Arial fonts
-    styles = getSampleStyleSheet()
-    styles['Title'].fontName = 'Arial-Bold'
-    styles['Heading2'].fontName = 'Arial-Bold'
-    styles['Heading5'].fontName = 'Arial-Bold'
-    styles['BodyText'].fontName = 'Arial'
-
-    # Define paragraph styles for body and headers
-    body_style = ParagraphStyle(
-        'body', parent=styles['BodyText'],
-        fontName='Arial', fontSize=8, leading=10
-    )
-    header_style = ParagraphStyle(
-        'hdr', parent=styles['Heading5'],
-        fontName='Arial-Bold', fontSize=8,
-        leading=10, alignment=1  # centered
-    )
-
+    styles = PDF_STYLES
     elems = []
     # Title and spacing
     elems.append(Paragraph("RetroTrack Logistics Inefficiency Report", styles['Title']))
@@ -91,23 +159,19 @@ def download_report_pdf(file_id):
 
     # --- Inefficient Routes ---
     if summary['ineff_table']:
-        keys = [
-            "base_address", "shipping_address",
-            "starting_time", "expected_delivery_time",
-            "actual_delivery_time", "delay_hours",
-            "optimized_delivery_time", "time_saved"
-        ]
-        headers = [
-            "Base Address", "Shipping Address",
-            "Start Time", "Expected Time",
-            "Actual Time", "Delay (h)",
-            "Optimized (h)", "Time Saved (h)"
-        ]
-
-        # Build table data: header row + one row per route
-        data = [[Paragraph(h, header_style) for h in headers]]
-        for row in summary['ineff_table']:
-            data.append([Paragraph(str(row[k]), body_style) for k in keys])
+        # Build table data: header row + one row per route. Only the address
+        # columns need wrapping, so only they become Paragraphs; the rest are
+        # plain strings drawn directly in the table's body font. Header
+        # Paragraphs are still made per request: Table wraps them in place,
+        # storing layout state, so they are not shared between threads
+        data = [[Paragraph(h, HEADER_STYLE) for h in INEFF_HEADERS]]
+        data.extend(
+            [
+                Paragraph(str(v), BODY_STYLE) if wrap else str(v)
+                for v, wrap in zip(INEFF_GETTER(row), INEFF_WRAP)
+            ]
+            for row in summary['ineff_table']
+        )
 
         # Create and style the table
         col_widths = [120, 120, 60, 60, 60, 40, 40, 40]
@@ -116,6 +180,10 @@ def download_report_pdf(file_id):
             ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
             ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
             ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTNAME', (0, 1), (-1, -1), FONT),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            # Delay / optimized / saved hours
+            ('ALIGN', (5, 1), (-1, -1), 'RIGHT'),
         ]))
         elems.append(Paragraph("Inefficient Routes", styles['Heading2']))
         elems.append(tbl)
@@ -123,21 +191,14 @@ def download_report_pdf(file_id):
 
     # --- Cost Analysis ---
     if summary['cost_table']:
-        keys2 = [
-            "route_id", "base_address", "shipping_address",
-            "actual_duration", "optimized_time",
-            "max_delivery_cost", "optimized_cost",
-            "actual_cost", "cost_saved"
-        ]
-        headers2 = [
-            "Route ID", "Base Address", "Shipping Address",
-            "Actual Dur (h)", "Optimized (h)",
-            "Max Cost", "Opt Cost", "Act Cost", "Saved"
-        ]
-
-        data2 = [[Paragraph(h, header_style) for h in headers2]]
-        for row in summary['cost_table']:
-            data2.append([Paragraph(str(row[k]), body_style) for k in keys2])
+        data2 = [[Paragraph(h, HEADER_STYLE) for h in COST_HEADERS]]
+        data2.extend(
+            [
+                Paragraph(str(v), BODY_STYLE) if wrap else str(v)
+                for v, wrap in zip(COST_GETTER(row), COST_WRAP)
+            ]
+            for row in summary['cost_table']
+        )
 
         col_widths2 = [30, 90, 90, 50, 50, 60, 60, 60, 60]
         tbl2 = Table(data2, repeatRows=1, colWidths=col_widths2)
@@ -145,152 +206,100 @@ def download_report_pdf(file_id):
             ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
             ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
             ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTNAME', (0, 1), (-1, -1), FONT),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            # Route ID, then the hour and cost columns after the addresses
+            ('ALIGN', (0, 1), (0, -1), 'RIGHT'),
+            ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),
         ]))
         elems.append(Paragraph("Cost Analysis", styles['Heading2']))
         elems.append(tbl2)
         elems.append(Spacer(1, 24))
 
     # --- Chart ---
-    chart_file = os.path.join(
-        app.root_path, 'static', 'plots',
-        f"cost_waste_{file_id}.png"
-    )
-    if os.path.exists(chart_file):
+    chart = _chart_stream(summary['chart_path'])
+    if chart is not None:
         elems.append(Paragraph("Cost Saved Visualization", styles['Heading2']))
         elems.append(Spacer(1, 12))
-        elems.append(Image(chart_file, width=400, height=200))
+        elems.append(Image(chart, width=400, height=200))
         elems.append(Spacer(1, 24))
 
-    # Build PDF and send as attachment
+    # Build PDF and rewind it for reading
     doc.build(elems)
     buffer.seek(0)
-    return send_file(
-        buffer,
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=f'report_{file_id}.pdf'
-    )
-
-
-@app.route('/download_report_word/<int:file_id>')
-def download_report_word(file_id):
-    """Build and send the report as a Word document."""
-
-    # Ensure the user is logged in
-    if 'user_id' not in session:
-        flash("Login required.", "danger")
-        return redirect(url_for('login'))
+    return buffer
 
-    # Fetch current user and generate the summary data
-    user = User.query.get(session['user_id'])
-    summary = generate_summary(file_id, user)
 
+def build_docx(summary):
+    """Render a report summary as a Word document; returns a spooled buffer rewound to the start."""
     # Create a new Word document
     docx = Document()
     docx.add_heading("RetroTrack Logistics Inefficiency Report", 0)
 
     # --- Summary Table (2 columns) ---
-    tbl = docx.add_table(rows=1, cols=2)
-    hdr = tbl.rows[0].cells
-    hdr[0].text = "Metric"
-    hdr[1].text = "Value"
-    for key in [
+    metrics = [
         'file_name', 'upload_date', 'inefficient_routes',
         'total_delayed_hours', 'avg_delayed_hours',
         'total_time_saved', 'avg_time_saved',
         'total_cost_saved', 'avg_cost_saved'
-    ]:
-        row = tbl.add_row().cells
+    ]
+    tbl = docx.add_table(rows=len(metrics) + 1, cols=2)
+    cells = tbl._cells
+    cells[0].text = "Metric"
+    cells[1].text = "Value"
+    for r, key in enumerate(metrics, 1):
         # Capitalize and format metric name
-        row[0].text = key.replace('_', ' ').title()
+        cells[2 * r].text = key.replace('_', ' ').title()
         # Convert the summary value to string
-        row[1].text = str(summary[key])
+        cells[2 * r + 1].text = str(summary[key])
     docx.add_paragraph()  # Add spacing after the table
 
     # --- Inefficient Routes Table ---
     if summary['ineff_table']:
-        keys = [
-            "base_address", "shipping_address",
-            "starting_time", "expected_delivery_time",
-            "actual_delivery_time", "delay_hours",
-            "optimized_delivery_time", "time_saved"
-        ]
-        hdrs = [
-            "Base Address", "Shipping Address",
-            "Start Time", "Expected Time",
-            "Actual Time", "Delay (h)",
-            "Optimized (h)", "Time Saved (h)"
-        ]
-
-        # Create table with header row
-        t = docx.add_table(rows=1, cols=len(keys))
-        for i, h in enumerate(hdrs):
-            t.rows[0].cells[i].text = h
+        # Create the whole table up front and fill its flat cell list; add_row()
+        # and row.cells re-walk the table XML on every call
+        ncols = len(INEFF_KEYS)
+        t = docx.add_table(rows=len(summary['ineff_table']) + 1, cols=ncols)
+        cells = t._cells
+        for i, h in enumerate(INEFF_HEADERS):
+            cells[i].text = h
         # Populate rows with data
-        for row in summary['ineff_table']:
-            r = t.add_row().cells
-            for i, k in enumerate(keys):
-                r[i].text = str(row[k])
+        for r, row in enumerate(summary['ineff_table'], 1):
+            for cell, v in zip(cells[r * ncols:(r + 1) * ncols], INEFF_GETTER(row)):
+                cell.text = str(v)
         docx.add_paragraph()
 
     # --- Cost Analysis Table ---
     if summary['cost_table']:
-        keys = [
-            "route_id", "base_address", "shipping_address",
-            "actual_duration", "optimized_time",
-            "max_delivery_cost", "optimized_cost",
-            "actual_cost", "cost_saved"
-        ]
-        hdrs = [
-            "Route ID", "Base Address", "Shipping Address",
-            "Actual Dur (h)", "Optimized (h)",
-            "Max Cost", "Opt Cost", "Act Cost", "Saved"
-        ]
-        t2 = docx.add_table(rows=1, cols=len(keys))
-        for i, h in enumerate(hdrs):
-            t2.rows[0].cells[i].text = h
-        for row in summary['cost_table']:
-            r = t2.add_row().cells
-            for i, k in enumerate(keys):
-                r[i].text = str(row[k])
+        ncols = len(COST_KEYS)
+        t2 = docx.add_table(rows=len(summary['cost_table']) + 1, cols=ncols)
+        cells = t2._cells
+        for i, h in enumerate(COST_HEADERS):
+            cells[i].text = h
+        for r, row in enumerate(summary['cost_table'], 1):
+            for cell, v in zip(cells[r * ncols:(r + 1) * ncols], COST_GETTER(row)):
+                cell.text = str(v)
 
     # --- Insert Chart if Available ---
-    chart_path = os.path.join(
-        app.root_path, 'static', 'plots',
-        f"cost_waste_{file_id}.png"
-    )
-    if os.path.exists(chart_path):
+    chart = _chart_stream(summary['chart_path'])
+    if chart is not None:
         # Embed the chart image at 6 inches wide
-        docx.add_picture(chart_path, width=Inches(6))
+        docx.add_picture(chart, width=Inches(6))
 
-    # Save document to buffer and send as attachment
-    buf = io.BytesIO()
+    # Save document to a spooled buffer and rewind it for reading
+    buf = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+b')
     docx.save(buf)
     buf.seek(0)
-    return send_file(
-        buf,
-        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        as_attachment=True,
-        download_name=f"report_{file_id}.docx"
-    )
+    return buf
 
 
-@app.route('/download_report_excel/<int:file_id>')
-def download_report_excel(file_id):
-    """
-       Build and send the report as an Excel (.xlsx) workbook.
-    """
-    if 'user_id' not in session:
-        flash("Login required.", "danger")
-        return redirect(url_for('login'))
-
-    # Fetch current user and generate the summary data
-    user = User.query.get(session['user_id'])
-    summary = generate_summary(file_id, user)
-
-    # Create an in-memory Excel workbook
-    buf = io.BytesIO()
-    wb = xlsxwriter.Workbook(buf)
+def build_xlsx(summary):
+    """Render a report summary as an Excel workbook; returns a spooled buffer rewound to the start."""
+    # Create the Excel workbook in a spooled buffer
+    buf = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+b')
+    # constant_memory flushes each row to disk once the next one starts, so
+    # memory stays flat however many routes there are; rows go in order
+    wb = xlsxwriter.Workbook(buf, {'constant_memory': True})
 
     # Add worksheets for summary, inefficient routes, and cost analysis
     summary_ws = wb.add_worksheet("Summary")
@@ -298,50 +307,197 @@ def download_report_excel(file_id):
     cost_ws = wb.add_worksheet("Cost Analysis")
 
     # --- Write Summary ---
-    row = 0
-    for key in [
+    # Metric name in first column, metric value in second column
+    for row, key in enumerate([
         'file_name', 'upload_date', 'user_name', 'user_email',
         'inefficient_routes', 'total_delayed_hours',
         'avg_delayed_hours', 'total_time_saved',
         'avg_time_saved', 'total_cost_saved', 'avg_cost_saved'
-    ]:
-        # Metric name in first column
-        summary_ws.write(row, 0, key.replace('_', ' ').title())
-        # Metric value in second column
-        summary_ws.write(row, 1, summary[key])
-        row += 1
+    ]):
+        summary_ws.write_row(row, 0, (key.replace('_', ' ').title(), summary[key]))
 
     # --- Write Inefficient Routes Table ---
     headers = list(summary['ineff_table'][0].keys()) if summary['ineff_table'] else []
-    for col, h in enumerate(headers):
-        ineff_ws.write(0, col, h)
-    for i, item in enumerate(summary['ineff_table'], 1):
-        for j, h in enumerate(headers):
-            ineff_ws.write(i, j, item[h])
+    ineff_ws.write_row(0, 0, headers)
+    if headers:
+        getter = itemgetter(*headers)
+        for i, item in enumerate(summary['ineff_table'], 1):
+            ineff_ws.write_row(i, 0, getter(item))
 
     # --- Write Cost Analysis Table ---
     headers = list(summary['cost_table'][0].keys()) if summary['cost_table'] else []
-    for col, h in enumerate(headers):
-        cost_ws.write(0, col, h)
-    for i, item in enumerate(summary['cost_table'], 1):
-        for j, h in enumerate(headers):
-            cost_ws.write(i, j, item[h])
+    cost_ws.write_row(0, 0, headers)
+    if headers:
+        getter = itemgetter(*headers)
+        for i, item in enumerate(summary['cost_table'], 1):
+            cost_ws.write_row(i, 0, getter(item))
 
     # --- Insert Chart Image if Present ---
-    chart_path = os.path.join(
-        app.root_path, 'static', 'plots',
-        f"cost_waste_{file_id}.png"
-    )
-    if os.path.exists(chart_path):
+    chart = _chart_stream(summary['chart_path'])
+    if chart is not None:
         # Place the chart at cell N2
-        cost_ws.insert_image('N2', chart_path)
+        cost_ws.insert_image('N2', os.path.basename(summary['chart_path']), {'image_data': chart})
 
-    # Finalize and close the workbook, then return it as a download
+    # Finalize and close the workbook, then rewind it for reading
     wb.close()
     buf.seek(0)
+    return buf
+
+
+REPORT_BUILDERS = {'pdf': build_pdf, 'docx': build_docx, 'xlsx': build_xlsx}
+
+
+def _write_report(path, builder, summary):
+    """Build one report document and move it into place at path in one step."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with builder(summary) as part, open(tmp_path, 'wb') as out:
+            shutil.copyfileobj(part, out)
+        os.replace(tmp_path, path)
+    finally:
+        # Only left behind if building or writing failed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _cached_reports(file, user, exts):
+    """
+        Return {ext: path} of the file's report documents in REPORT_FOLDER, building
+        any format not yet on disk for the file's current updated_at and this user
+        (whose name and email appear in the report). Several missing formats are
+        built side by side on the shared pool.
+    """
+    file_id = file.id
+    digest = hashlib.blake2b(
+        repr((file.updated_at, user.first_name, user.last_name, user.email)).encode(), digest_size=8
+    ).hexdigest()
+    folder = app.config['REPORT_FOLDER']
+    paths = {ext: os.path.join(folder, f"report_{file_id}_{digest}.{ext}") for ext in exts}
+
+    summary = None
+    missing = [ext for ext, path in paths.items() if not os.path.exists(path)]
+    if missing:
+        os.makedirs(folder, exist_ok=True)
+        summary = get_summary(file, user)
+        if len(missing) == 1:
+            _write_report(paths[missing[0]], REPORT_BUILDERS[missing[0]], summary)
+        else:
+            # The builders only read the summary, so they need no app context
+            futures = [
+                _build_pool.submit(_write_report, paths[ext], REPORT_BUILDERS[ext], summary)
+                for ext in missing
+            ]
+            for future in futures:
+                future.result()
+    # Drop documents built for earlier versions of this file once no longer in use
+    remove_cached_reports(file_id, keep_digest=digest)
+
+    # Mark the documents as in use: cleanup of superseded versions skips files used
+    # within REPORT_CLEANUP_GRACE, so the path stays valid until it has been sent
+    for ext, path in paths.items():
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed since it was checked or built; build it again
+            if summary is None:
+                summary = get_summary(file, user)
+            _write_report(path, REPORT_BUILDERS[ext], summary)
+    return paths
+
+
+@app.route('/report/<int:file_id>')
+def report_preview(file_id):
+    """Render an HTML preview of the report before download."""
+    if 'user_id' not in session:
+        flash("Login required.", "danger")
+        return redirect(url_for('login'))
+
+    user, file = _load_report_ctx(file_id)
+    summary = get_summary(file, user)
+    return render_template(
+        "report_preview.html",
+        summary=summary,
+        file_id=file_id,
+        chart_url=summary['chart_url']
+    )
+
+
+@app.route('/download_report_pdf/<int:file_id>')
+def download_report_pdf(file_id):
+    """Build and send the report as a PDF file."""
+    if 'user_id' not in session:
+        flash("Login required.", "danger")
+        return redirect(url_for('login'))
+
+    user, file = _load_report_ctx(file_id)
+    # Served from the on-disk copy; send_file can hand it to X-Sendfile
     return send_file(
-        buf,
+        _cached_reports(file, user, ('pdf',))['pdf'],
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'report_{file_id}.pdf'
+    )
+
+
+@app.route('/download_report_word/<int:file_id>')
+def download_report_word(file_id):
+    """Build and send the report as a Word document."""
+
+    # Ensure the user is logged in
+    if 'user_id' not in session:
+        flash("Login required.", "danger")
+        return redirect(url_for('login'))
+
+    # Fetch current user and their file
+    user, file = _load_report_ctx(file_id)
+    # Served from the on-disk copy; send_file can hand it to X-Sendfile
+    return send_file(
+        _cached_reports(file, user, ('docx',))['docx'],
+        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        as_attachment=True,
+        download_name=f"report_{file_id}.docx"
+    )
+
+
+@app.route('/download_report_excel/<int:file_id>')
+def download_report_excel(file_id):
+    """
+       Build and send the report as an Excel (.xlsx) workbook.
+    """
+    if 'user_id' not in session:
+        flash("Login required.", "danger")
+        return redirect(url_for('login'))
+
+    # Fetch current user and their file
+    user, file = _load_report_ctx(file_id)
+    # Served from the on-disk copy; send_file can hand it to X-Sendfile
+    return send_file(
+        _cached_reports(file, user, ('xlsx',))['xlsx'],
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
         download_name=f"report_{file_id}.xlsx"
     )
+
+
+@app.route('/download_report_bundle/<int:file_id>')
+def download_report_bundle(file_id):
+    """Build the PDF, Word and Excel reports concurrently and send them as one zip."""
+    if 'user_id' not in session:
+        flash("Login required.", "danger")
+        return redirect(url_for('login'))
+
+    user, file = _load_report_ctx(file_id)
+    paths = _cached_reports(file, user, ('pdf', 'docx', 'xlsx'))
+
+    # The documents are compressed already, so they are stored in the zip as-is
+    buf = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+b')
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_STORED) as zf:
+        for ext, path in paths.items():
+            zf.write(path, f"report_{file_id}.{ext}")
+    buf.seek(0)
+    return send_file(
+        buf,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"report_{file_id}.zip"
+    )
@@ -4,7 +4,8 @@ from flask import render_template, redirect, url_for, flash, session
 
 from . import app, db, bcrypt
 from .forms import RegistrationForm, LoginForm, ProfileEditForm
-from .models import User, File
+from .helpers import current_user, current_user_files
+from .models import User
 
 
 @app.context_processor
@@ -15,12 +16,12 @@ def inject_now():
 @app.route('/')
 def home():
     """Render homepage and, if logged in, load user info and files."""
-    user = None
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            user_files = File.query.filter_by(user_id=user.id).all()
-            session['user_files'] = [{"id": f.id, "filename": f.filename} for f in user_files]
+    user = current_user()
+    if user:
+        user_files = [{"id": f.id, "filename": f.filename} for f in current_user_files()]
+        # Only rewrite the session (and its cookie) when the list actually changed
+        if session.get('user_files') != user_files:
+            session['user_files'] = user_files
     return render_template('homepage.html', user=user)
 
 
@@ -29,6 +30,11 @@ def register():
     """Handle new user registration via a WTForm."""
     form = RegistrationForm()
     if form.validate_on_submit():
+        # Reject a taken email before paying for a bcrypt hash (and before the
+        # unique constraint would fail the commit)
+        if db.session.query(User.id).filter(User.email == form.email.data).first():
+            flash("An account with that email already exists.", "danger")
+            return render_template('register.html', form=form)
         hashed = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
         usr = User(
             first_name=form.first_name.data,
@@ -74,7 +80,7 @@ def profile():
     if 'user_id' not in session:
         flash("Login required.", "danger")
         return redirect(url_for('login'))
-    usr = User.query.get(session['user_id'])
+    usr = current_user()
     if not usr:
         flash("User not found.", "danger")
         return redirect(url_for('logout'))
@@ -87,7 +93,7 @@ def edit_profile():
     if 'user_id' not in session:
         flash("Login required.", "danger")
         return redirect(url_for('login'))
-    usr = User.query.get(session['user_id'])
+    usr = current_user()
     if not usr:
         flash("User not found.", "danger")
         return redirect(url_for('logout'))
@@ -104,8 +110,5 @@ def edit_profile():
 @app.context_processor
 def inject_user_files():
     """Inject the current user's file list into all templates."""
-    if 'user_id' in session:
-        files = File.query.filter_by(user_id=session['user_id']).all()
-    else:
-        files = []
-    return dict(user_files=files)
+    # Only id and filename are rendered in the menu; shared with home() per request
+    return dict(user_files=current_user_files())
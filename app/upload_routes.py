@@ -1,13 +1,27 @@
-import json
+import io
 import os
+from datetime import datetime
 
 from flask import render_template, redirect, url_for, flash, session, request
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 from . import app, db
-from .helpers import parse_excel, to_float, update_cached_routes
+from .helpers import (
+    iter_route_batches, invalidate_summary, remove_cached_reports, schedule_route_updates
+)
 from .models import File, InefficientRoute
 
+# Frozen once at import so the upload path skips the app.config lookup per request
+_ALLOWED_EXTS = frozenset(app.config['ALLOWED_EXTENSIONS'])
+_EXCEL_EXTS = frozenset({'xls', 'xlsx'})
+
+
+def split_ext(filename):
+    """Return the lower-cased extension of filename, or '' if it has none."""
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
+
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
@@ -17,100 +31,90 @@ def upload():
         return redirect(url_for('login'))
 
     if request.method == 'POST':
-        # Client-side size check: reject requests over 10 MB
-        if request.content_length and request.content_length > 10 * 1024 * 1024:
-            flash("File too large (>10MB).", "danger")
-            return redirect(url_for('upload'))
-
+        # Bodies over MAX_CONTENT_LENGTH never get here: reading the form raises
+        # RequestEntityTooLarge, handled by upload_too_large
         file = request.files.get('file')
         if not file or file.filename == '':
             flash("No file selected.", "danger")
             return redirect(url_for('upload'))
 
         # Extract and validate file extension
-        ext = file.filename.rsplit('.', 1)[-1].lower()
-        if ext in app.config['ALLOWED_EXTENSIONS']:
-            fname = secure_filename(file.filename)
-            fpath = os.path.join(app.config['UPLOAD_FOLDER'], fname)
-            file.save(fpath)
-            size_kb = os.path.getsize(fpath) / 1024.0
-
-            # Server-side size check: re-verify file is under 10 MB
-            if size_kb > 10240:
-                os.remove(fpath)
-                flash("File too large (>10MB).", "danger")
-                return redirect(url_for('upload'))
-
-            try:
-                # Save file metadata to the database
-                new_file = File(filename=fname, size=size_kb, user_id=session['user_id'])
-                db.session.add(new_file)
-                db.session.commit()
-
-                # Parse only Excel for routes
-                if ext in ['xls', 'xlsx']:
-                    parsed = parse_excel(fpath)
-                else:
-                    flash("Only Excel files are supported for parsing inefficient routes.", "danger")
-                    return redirect(url_for('upload'))
-
-                # Store raw parsed JSON
-                new_file.parsed_data = json.dumps(parsed, default=str)
-                db.session.commit()
-
-                # Insert any delay>24h routes
-                for route in parsed.get('inefficient_routes', []):
-                    delay = route.get("delay_hours")
-                    if delay is None:
-                        ev = to_float(route["expected_delivery_time"])
-                        av = to_float(route["actual_delivery_time"])
-                        if ev is not None and av is not None:
-                            delay = av - ev
-                        else:
-                            try:
-                                delay = (route["actual_delivery_time"] - route["expected_delivery_time"]) \
-                                            .total_seconds() / 3600.0
-                            except:
-                                continue
-
-                    if delay > 24:
-                        ir = InefficientRoute(
-                            file_id=new_file.id,
-                            base_address=route["base_address"],
-                            shipping_address=route["shipping_address"],
-                            starting_time=route["starting_time"],
-                            expected_delivery_time=route["expected_delivery_time"],
-                            actual_delivery_time=route["actual_delivery_time"],
-                            expected_delivery_cost=to_float(route["expected_delivery_cost"]),
-                            actual_delivery_cost=to_float(route["actual_delivery_cost"]),
-                            max_delivery_cost=to_float(route["max_delivery_cost"])
-                        )
-                        db.session.add(ir)
-                db.session.commit()
-
-                # Now fetch them and update with optimized times & time_saved
-                routes = InefficientRoute.query.filter_by(file_id=new_file.id).all()
-                update_cached_routes(routes)
-
-                flash("File uploaded and processed successfully!", "success")
-                return redirect(url_for('files'))
-
-            except Exception as e:
-                db.session.rollback()
-                flash("Error processing the file.", "danger")
-                print("Error:", e)
-
-            finally:
-                if os.path.exists(fpath):
-                    os.remove(fpath)
-
-        else:
+        ext = split_ext(file.filename)
+        if ext not in _ALLOWED_EXTS:
             flash("Invalid file extension.", "danger")
             return redirect(url_for('upload'))
 
+        # Parse only Excel for routes; reject others before anything is stored
+        if ext not in _EXCEL_EXTS:
+            flash("Only Excel files are supported for parsing inefficient routes.", "danger")
+            return redirect(url_for('upload'))
+
+        fname = secure_filename(file.filename)
+
+        # Read the upload straight into memory and hand the buffer to the parser;
+        # nothing lands in UPLOAD_FOLDER. Its size is already bounded by
+        # MAX_CONTENT_LENGTH, so it needs no second check
+        data = file.stream.read()
+        size_kb = len(data) / 1024.0
+
+        try:
+            # Save file metadata to the database
+            new_file = File(filename=fname, size=size_kb, user_id=session['user_id'])
+            db.session.add(new_file)
+            db.session.flush()
+
+            # Stream delay>24h routes into the table batch by batch, so memory
+            # stays bounded by the batch size rather than the workbook size.
+            # A Core INSERT runs as one DB-API executemany, bypassing ORM dispatch.
+            insert_routes = InefficientRoute.__table__.insert()
+            count = 0
+            for batch in iter_route_batches(io.BytesIO(data)):
+                db.session.execute(insert_routes, [
+                    {
+                        "file_id": new_file.id,
+                        "base_address": r["base_address"],
+                        "shipping_address": r["shipping_address"],
+                        "starting_time": r["starting_time"],
+                        "expected_delivery_time": r["expected_delivery_time"],
+                        "actual_delivery_time": r["actual_delivery_time"],
+                        "expected_delivery_cost": r["expected_delivery_cost"],
+                        "actual_delivery_cost": r["actual_delivery_cost"],
+                        "max_delivery_cost": r["max_delivery_cost"],
+                        "delay_hours": r["delay_hours"],
+                        "actual_duration_hours": r["actual_duration_hours"]
+                    }
+                    for r in batch
+                ])
+                count += len(batch)
+
+            # Routes are normalized into InefficientRoute, so only a summary is kept
+            # and the file is marked imported for the /inefficient importer
+            new_file.parsed_data = {"count": count}
+            new_file.parsed_imported_at = datetime.utcnow()
+            db.session.commit()
+
+            # Optimized times & time_saved are filled in by a background job,
+            # so the upload returns without waiting on Geoapify
+            schedule_route_updates(new_file.id)
+
+            flash("File uploaded and processed successfully!", "success")
+            return redirect(url_for('files'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash("Error processing the file.", "danger")
+            print("Error:", e)
+
     return render_template('upload.html', form_action=url_for('upload'))
 
 
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """Send requests over MAX_CONTENT_LENGTH back to the upload form."""
+    flash("File too large (>10MB).", "danger")
+    return redirect(url_for('upload'))
+
+
 @app.route('/delete-file/<int:file_id>', methods=['POST'])
 def delete_file(file_id):
     """Remove a file and its associated data if the user is authorized."""
@@ -130,10 +134,14 @@ def delete_file(file_id):
     except Exception as e:
         flash(f"Error deleting file: {e}", "danger")
 
+    # A background update still running for the file finds its routes gone:
+    # its updates match no rows and it stores no summary for a missing file
     try:
         InefficientRoute.query.filter_by(file_id=file_id).delete()
         db.session.delete(this_file)
         db.session.commit()
+        invalidate_summary(file_id)
+        remove_cached_reports(file_id)
         flash("File and data deleted.", "success")
     except Exception as e:
         db.session.rollback()
@@ -149,5 +157,10 @@ def files():
         flash("Login required.", "danger")
         return redirect(url_for('login'))
 
-    user_files = File.query.filter_by(user_id=session['user_id']).all()
-    return render_template('files.html', files=user_files)
+    # Select only the listed columns; parsed_data is never loaded for the table
+    pagination = db.session.query(
+        File.id, File.filename, File.size, File.upload_date
+    ).filter(File.user_id == session['user_id']).order_by(File.id).paginate(
+        page=request.args.get('page', 1, type=int), per_page=100
+    )
+    return render_template('files.html', files=pagination.items, pagination=pagination)
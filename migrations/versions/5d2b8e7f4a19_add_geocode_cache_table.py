@@ -0,0 +1,30 @@
+"""Add geocode_cache table for coordinates per normalized address
+
+Revision ID: 5d2b8e7f4a19
+Revises: e4a9c61b2d78
+Create Date: 2026-10-16 12:41:52.206817
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5d2b8e7f4a19'
+down_revision = 'e4a9c61b2d78'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'geocode_cache',
+        sa.Column('address_hash', sa.String(length=40), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('address_hash')
+    )
+
+
+def downgrade():
+    op.drop_table('geocode_cache')
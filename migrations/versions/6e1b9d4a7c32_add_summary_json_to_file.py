@@ -0,0 +1,28 @@
+"""Add summary_json and summary_stamp to file for persisted report summaries
+
+Revision ID: 6e1b9d4a7c32
+Revises: a83f5c2e7d90
+Create Date: 2026-10-16 18:02:41.316208
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '6e1b9d4a7c32'
+down_revision = 'a83f5c2e7d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Left empty for existing files; summaries are built on the next report request
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary_json', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('summary_stamp', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_column('summary_stamp')
+        batch_op.drop_column('summary_json')
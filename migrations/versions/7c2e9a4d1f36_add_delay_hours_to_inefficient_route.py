@@ -0,0 +1,33 @@
+"""Add stored delay_hours column to inefficient_route
+
+Revision ID: 7c2e9a4d1f36
+Revises: 41b9b65f53bf
+Create Date: 2026-10-16 09:12:40.418263
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a4d1f36'
+down_revision = '41b9b65f53bf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('delay_hours', sa.Float(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_inefficient_route_delay_hours'), ['delay_hours'], unique=False)
+
+    # Backfill existing rows from their stored timestamps; rounding drops julianday's float noise
+    op.execute(
+        "UPDATE inefficient_route SET delay_hours = "
+        "ROUND((julianday(actual_delivery_time) - julianday(expected_delivery_time)) * 24, 6)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_inefficient_route_delay_hours'))
+        batch_op.drop_column('delay_hours')
@@ -0,0 +1,24 @@
+"""Add composite (file_id, base_address, starting_time) index on inefficient_route
+
+Revision ID: 9a6c3f0e8b41
+Revises: 5d2b8e7f4a19
+Create Date: 2026-10-16 13:27:09.640158
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9a6c3f0e8b41'
+down_revision = '5d2b8e7f4a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.create_index('ix_ir_file_base_start', ['file_id', 'base_address', 'starting_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.drop_index('ix_ir_file_base_start')
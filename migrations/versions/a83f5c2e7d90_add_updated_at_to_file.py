@@ -0,0 +1,31 @@
+"""Add updated_at to file for report summary cache keys
+
+Revision ID: a83f5c2e7d90
+Revises: f2d47b9c1e65
+Create Date: 2026-10-16 15:48:20.774315
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a83f5c2e7d90'
+down_revision = 'f2d47b9c1e65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing files were last changed no earlier than their upload
+    op.execute("UPDATE file SET updated_at = upload_date")
+
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
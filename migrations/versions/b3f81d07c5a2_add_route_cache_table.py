@@ -0,0 +1,29 @@
+"""Add route_cache table for optimized times per address pair
+
+Revision ID: b3f81d07c5a2
+Revises: 7c2e9a4d1f36
+Create Date: 2026-10-16 10:03:17.552904
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b3f81d07c5a2'
+down_revision = '7c2e9a4d1f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'route_cache',
+        sa.Column('base_address', sa.String(length=255), nullable=False),
+        sa.Column('shipping_address', sa.String(length=255), nullable=False),
+        sa.Column('optimized_time', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('base_address', 'shipping_address')
+    )
+
+
+def downgrade():
+    op.drop_table('route_cache')
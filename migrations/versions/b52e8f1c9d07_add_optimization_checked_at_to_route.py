@@ -0,0 +1,32 @@
+"""Add optimization_checked_at to inefficient_route
+
+Revision ID: b52e8f1c9d07
+Revises: 6e1b9d4a7c32
+Create Date: 2026-10-16 21:14:05.502913
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b52e8f1c9d07'
+down_revision = '6e1b9d4a7c32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('optimization_checked_at', sa.DateTime(), nullable=True))
+
+    # Routes that already have a saving were processed; the rest are checked
+    # (once) by the next background update
+    op.execute(
+        "UPDATE inefficient_route SET optimization_checked_at = CURRENT_TIMESTAMP "
+        "WHERE optimized_delivery_time IS NOT NULL AND time_saved IS NOT NULL"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.drop_column('optimization_checked_at')
@@ -0,0 +1,33 @@
+"""Store file.parsed_data as JSON and add parsed_imported_at
+
+Revision ID: c71e2a9d5f03
+Revises: 9a6c3f0e8b41
+Create Date: 2026-10-16 14:05:33.187420
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c71e2a9d5f03'
+down_revision = '9a6c3f0e8b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.alter_column('parsed_data',
+                              existing_type=sa.Text(),
+                              type_=sa.JSON(),
+                              existing_nullable=True)
+        batch_op.add_column(sa.Column('parsed_imported_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_column('parsed_imported_at')
+        batch_op.alter_column('parsed_data',
+                              existing_type=sa.JSON(),
+                              type_=sa.Text(),
+                              existing_nullable=True)
@@ -0,0 +1,30 @@
+"""Index file.user_id and inefficient_route.file_id
+
+Revision ID: e4a9c61b2d78
+Revises: b3f81d07c5a2
+Create Date: 2026-10-16 11:20:05.913472
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c61b2d78'
+down_revision = 'b3f81d07c5a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_file_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inefficient_route_file_id'), ['file_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_inefficient_route_file_id'))
+
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_file_user_id'))
@@ -0,0 +1,31 @@
+"""Add stored actual_duration_hours column to inefficient_route
+
+Revision ID: f2d47b9c1e65
+Revises: c71e2a9d5f03
+Create Date: 2026-10-16 15:12:46.530921
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f2d47b9c1e65'
+down_revision = 'c71e2a9d5f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('actual_duration_hours', sa.Float(), nullable=False, server_default='0'))
+
+    # Backfill existing rows from their stored timestamps; rounding drops julianday's float noise
+    op.execute(
+        "UPDATE inefficient_route SET actual_duration_hours = "
+        "ROUND((julianday(actual_delivery_time) - julianday(starting_time)) * 24, 6)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('inefficient_route', schema=None) as batch_op:
+        batch_op.drop_column('actual_duration_hours')
@@ -1,12 +1,22 @@
-from urllib.parse import quote_plus
+import os
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-key = "27181d3f8ddc4ff5ac1258c1c0d2eee7"  # or your new key
+# Read the key from the environment instead of committing it
+key = os.environ['GEOAPIFY_API_KEY']
 address = "10, Đông Hưng Thuận 10, District 12, Ho Chi Minh City, 71507, Vietnam"
-encoded_address = quote_plus(address)
-url = f"https://api.geoapify.com/v1/geocode/search?text={encoded_address}&apiKey={key}&lang=vi&limit=1&format=json"
-headers = {"Accept": "application/json", "User-Agent": "TestClient/1.0"}
-response = requests.get(url, headers=headers)
+
+# Keep-alive session with retries, set up like the app's Geoapify client
+session = requests.Session()
+session.headers.update({"Accept": "application/json", "User-Agent": "TestClient/1.0"})
+session.mount('https://', HTTPAdapter(
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# requests URL-encodes the query parameters
+params = {"text": address, "apiKey": key, "lang": "vi", "limit": 1, "format": "json"}
+response = session.get("https://api.geoapify.com/v1/geocode/search", params=params, timeout=(3.05, 10))
 print("Status code:", response.status_code)
 print("Response:", response.json())